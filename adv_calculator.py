@@ -2,11 +2,53 @@ import tkinter as tk
 import math
 from tkinter import messagebox, Scrollbar
 
-memory_value = 0.0
-last_answer = 0.0
+from adv_calculator_core import CalculatorSession, format_compact, format_result
+
+# Memory, ANS and history live in the session; the globals below are view state
+session = CalculatorSession(trig_in_degrees=False)
 clr_flag = False
 exp_current = ""
 exp_prev = ""
+pending_input = []
+
+
+def queue_input(text):
+    # Coalesce a burst of keystrokes into one entry update per idle cycle
+    if not pending_input:
+        root.after_idle(flush_input)
+    pending_input.append(text)
+
+
+def flush_input():
+    if pending_input:
+        screen.insert(tk.END, "".join(pending_input))
+        pending_input.clear()
+
+
+def append_text(text):
+    # Insert in place instead of rebuilding the whole string
+    flush_input()
+    screen.insert(tk.END, text)
+
+
+def delete_last_char():
+    flush_input()
+    length = screen.index(tk.END)
+    if length:
+        screen.delete(length - 1)
+
+
+def paste_input(event=None):
+    if event is not None and event.widget is screen:
+        return  # the entry pastes at its own cursor
+    try:
+        text = root.clipboard_get()
+    except tk.TclError:
+        return "break"
+    append_text(text.replace("\n", "").replace("\r", ""))
+    return "break"
+
+
 def clear_screen():
     global clr_flag
     if clr_flag:
@@ -20,6 +62,14 @@ def on_key_press(event):
     global exp_prev
     print("*******", key, char)
 
+    # The entry edits itself when it has focus
+    if event.widget is screen and (key == "BackSpace" or (char and char in "0123456789+-*/().")):
+        return
+    if char and char in "0123456789+-*/().":
+        queue_input(char)
+        return
+    flush_input()
+
     # Press Enter or Return → Evaluate
     if key in ("Return", "KP_Enter"):
         calculate()
@@ -28,12 +78,7 @@ def on_key_press(event):
         screen_var.set("")
     # Backspace → delete last character
     elif key == "BackSpace":
-        screen_var.set(screen_var.get()[:-1])
-    # Allow typing numbers and math symbols
-    elif char in "0123456789+-*/().":
-        print("exp_current--------", exp_current)
-        print("exp_prev--------", exp_prev)
-        screen_var.set(screen_var.get() + char)
+        delete_last_char()
     # Shortcut keys
     elif key.lower() == "r":  # r → reciprocal
         apply_reciprocal()
@@ -52,6 +97,7 @@ def on_click(event):
     global exp_current
     global exp_prev
 
+    flush_input()
     clear_screen()
     if text == "=":
         calculate()
@@ -59,18 +105,18 @@ def on_click(event):
     elif text == "C":
         screen_var.set("")
     elif text == "⌫":
-        screen_var.set(screen_var.get()[:-1])
+        delete_last_char()
     elif text == "π":
         exp_current = text
-        screen_var.set(screen_var.get() + str(math.pi))
+        append_text(str(math.pi))
     elif text == "e":
         exp_current = text
-        screen_var.set(screen_var.get() + str(math.e))
+        append_text(str(math.e))
     elif text == "ANS":
-        screen_var.set(screen_var.get() + str(last_answer))
+        append_text("ANS")  # resolved by the evaluator, exact at any size
     elif text in ["sin", "cos", "tan", "log"]:
         exp_current = text
-        screen_var.set(screen_var.get() + text + "(")
+        append_text(text + "(")
     elif text == "√":
         exp_current = text
         apply_sqrt()
@@ -93,7 +139,7 @@ def on_click(event):
         if clr_flag:
             clear_screen
         print("screen var========", screen_var.get(), text,)
-        screen_var.set(screen_var.get() + text)
+        append_text(text)
         clr_flag = False
 
 
@@ -102,25 +148,18 @@ def append_operator(op):
     if not current:
         return
     if current[-1] in "+-*/":
-        screen_var.set(current[:-1] + op)
-    else:
-        screen_var.set(current + op)
+        screen.delete(len(current) - 1)
+    screen.insert(tk.END, op)
 
 
 def calculate(event=None):
-    global last_answer
     global clr_flag
+    flush_input()
     expression = screen_var.get()
-    original_expr = expression
     try:
-        expression = expression.replace("^", "**")
-        expression = expression.replace("ANS", str(last_answer))
-        for func in ["sin", "cos", "tan", "log", "sqrt"]:
-            expression = expression.replace(func + "(", f"math.{func}(")
-        result = eval(expression)
-        screen_var.set(result)
-        add_to_history(original_expr, result)
-        last_answer = result
+        session.evaluate(expression)
+        screen_var.set(format_result(session.last_answer))
+        show_last_history()
         update_ans_label()
         clr_flag = True
     except Exception:
@@ -135,10 +174,9 @@ def apply_square():
     if not exp:
         return
     try:
-        value = float(eval(exp.replace("ANS", str(last_answer))))
-        result = value ** 2
+        result = session.square(exp)
         screen_var.set(str(result))
-        add_to_history(f"({exp})²", result)
+        show_last_history()
         clr_flag = True
     except Exception:
         messagebox.showerror("Error", "Invalid square operation")
@@ -152,14 +190,11 @@ def apply_sqrt():
     if not exp:
         return
     try:
-        value = float(eval(exp.replace("ANS", str(last_answer))))
-        if value < 0:
-            raise ValueError
-        result = math.sqrt(value)
+        result = session.sqrt(exp)
         screen_var.set(str(result))
-        add_to_history(f"√({exp})", result)        
+        show_last_history()
     except ValueError as e:
-        messagebox.showerror("Error", "Cannot take square root of negative number")
+        messagebox.showerror("Error", str(e) or "Cannot take square root of negative number")
         clr_flag = False
     except Exception as e:
         messagebox.showerror("Error", "Invalid sqrt operation")
@@ -171,12 +206,9 @@ def apply_reciprocal():
     if not exp:
         return
     try:
-        value = float(eval(exp.replace("ANS", str(last_answer))))
-        if value == 0:
-            raise ZeroDivisionError
-        result = 1 / value
+        result = session.reciprocal(exp)
         screen_var.set(str(result))
-        add_to_history(f"1/({exp})", result)
+        show_last_history()
     except ZeroDivisionError:
         messagebox.showerror("Error", "Division by Zero")
     except Exception:
@@ -188,52 +220,41 @@ def apply_percentage():
     if not exp:
         return
     try:
-        for i in range(len(exp)-1, -1, -1):
-            if exp[i] in "+-*/":
-                operator = exp[i]
-                left = exp[:i]
-                right = exp[i+1:]
-                base = float(eval(left.replace("ANS", str(last_answer))))
-                perc = float(eval(right.replace("ANS", str(last_answer)))) / 100
-                if operator in "+-":
-                    value = base + base * perc if operator == "+" else base - base * perc
-                elif operator == "*":
-                    value = base * perc
-                elif operator == "/":
-                    value = base / perc
-                screen_var.set(str(value))
-                return
-        value = float(eval(exp.replace("ANS", str(last_answer)))) / 100
-        screen_var.set(str(value))
+        screen_var.set(str(session.percentage(exp)))
     except Exception:
         messagebox.showerror("Error", "Invalid use of %")
 
 
 def handle_memory(action):
-    global memory_value
     try:
         if action == "M+":
-            memory_value += float(screen_var.get() or 0)
+            session.memory_add(float(screen_var.get() or 0))
         elif action == "M-":
-            memory_value -= float(screen_var.get() or 0)
+            session.memory_subtract(float(screen_var.get() or 0))
         elif action == "MR":
-            screen_var.set(screen_var.get() + str(memory_value))
+            append_text(str(session.memory_recall()))
         elif action == "MC":
-            memory_value = 0.0
+            session.memory_clear()
         update_memory_label()
     except:
         messagebox.showerror("Error", "Invalid memory operation")
 
 
 def update_memory_label():
-    if memory_value != 0:
-        memory_label.config(text=f"Memory: {memory_value:.6g}")
+    if session.memory != 0:
+        memory_label.config(text=f"Memory: {session.memory:.6g}")
     else:
         memory_label.config(text="")
 
 
 def update_ans_label():
-    ans_label.config(text=f"ANS: {last_answer:.6g}")
+    ans = session.last_answer
+    text = f"{ans:.6g}" if isinstance(ans, float) else format_compact(ans)
+    ans_label.config(text=f"ANS: {text}")
+
+
+def show_last_history():
+    add_to_history(*session.history[-1])
 
 
 def add_to_history(expr, result):
@@ -253,6 +274,7 @@ def add_to_history(expr, result):
 
 
 def clear_history():
+    session.clear_history()
     history_text.delete(1.0, tk.END)
 
 
@@ -345,5 +367,6 @@ scrollbar.config(command=history_text.yview)
 clear_btn = tk.Button(root, text="Clear History", font="Consolas 11", bg="#d63031", fg="white",relief="flat", command=clear_history)
 clear_btn.pack(pady=8)
 root.bind_all("<Key>", on_key_press)
+root.bind_all("<<Paste>>", paste_input)
 
 root.mainloop()
@@ -0,0 +1,1121 @@
+"""
+Calculator core without any GUI dependency: the safe evaluator, result
+formatting, streaming statistics, batch files, sessions and snapshots.
+Both Tk front-ends are views over this module.
+"""
+import ast
+import decimal
+import gzip
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict, deque
+
+try:
+    import numpy as np
+except ImportError:  # array literals need NumPy; scalars work without it
+    np = None
+
+# -------------------------------
+# Safe expression evaluator (AST)
+# -------------------------------
+ALLOWED_NAMES = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+ALLOWED_FUNCS = {
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "log": math.log10,  # log base 10
+    "ln": math.log,     # natural log
+    "sqrt": math.sqrt,
+    "abs": abs,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "factorial": math.factorial,
+}
+
+ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow)
+ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+# Vectors and matrices ([1,2,3], [[1,2],[3,4]])
+ARRAY_MAX_ELEMENTS = 10_000
+
+if np is not None:
+    # Elementwise versions, used when an argument is an array
+    ARRAY_FUNCS = {
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "log": np.log10,
+        "ln": np.log,
+        "sqrt": np.sqrt,
+        "abs": np.abs,
+        "floor": np.floor,
+        "ceil": np.ceil,
+    }
+    LINALG_FUNCS = {
+        "dot": np.dot,
+        "det": np.linalg.det,
+        "inv": np.linalg.inv,
+        "solve": np.linalg.solve,
+        "sum": np.sum,
+        "mean": np.mean,
+    }
+else:
+    ARRAY_FUNCS = {}
+    LINALG_FUNCS = {}
+
+
+def _raise(msg="Invalid expression"):
+    raise ValueError(msg)
+
+
+def _check_array_size(size):
+    if size > ARRAY_MAX_ELEMENTS:
+        _raise("Array too large")
+
+
+def _dot_size(a, b):
+    """Element count of np.dot(a, b), worked out from the shapes alone."""
+    a, b = np.asarray(a), np.asarray(b)
+    if not a.ndim or not b.ndim:
+        return max(a.size, b.size)
+    return math.prod(a.shape[:-1]) * math.prod(b.shape[:-2] + b.shape[-1:])
+
+
+def _subtree_keys(root):
+    """
+    Common-subexpression table for a parsed tree: {id(node): key} for the
+    composite subtrees that occur more than once. Identical subtrees get the
+    same small int key, interned on (kind, op or name, child keys) so
+    hashing never recurses past one level.
+    """
+    interned = {}
+    counts = []
+    nodes = []
+
+    def key_of(n):
+        cls = n.__class__
+        if cls is ast.Constant:
+            return ("const", type(n.value), n.value)
+        if cls is ast.Name:
+            return ("name", n.id)
+        if cls is ast.BinOp:
+            parts = ("binop", n.op.__class__, key_of(n.left), key_of(n.right))
+        elif cls is ast.UnaryOp:
+            parts = ("unary", n.op.__class__, key_of(n.operand))
+        elif cls is ast.Call and n.func.__class__ is ast.Name and not n.keywords:
+            parts = ("call", n.func.id, *[key_of(a) for a in n.args])
+        elif cls is ast.List:
+            parts = ("list", *[key_of(e) for e in n.elts])
+        else:
+            return ("node", id(n))  # never shared; safe_eval rejects it anyway
+        key = interned.get(parts)
+        if key is None:
+            key = interned[parts] = len(counts)
+            counts.append(0)
+        counts[key] += 1
+        nodes.append((id(n), key))
+        return key
+
+    key_of(root.body)
+    if len(counts) == len(nodes):
+        return {}  # nothing repeats
+    return {i: k for i, k in nodes if counts[k] > 1}
+
+
+# An operator or opening bracket and the character after it; a lookahead
+# so that pairs like "+[" and "[1" may overlap
+_SHARE_PAIR = re.compile(r"(?=([-+*/%(\[].))")
+
+
+def _may_share(expr: str) -> bool:
+    """
+    Cheap text pre-check for _subtree_keys. The source of every composite
+    subtree holds an operator or opening bracket followed by another
+    character, so a subtree can only repeat if such a pair occurs twice
+    (ignoring whitespace). Otherwise the table is skipped. A false positive
+    only costs the table walk.
+    """
+    pairs = _SHARE_PAIR.findall("".join(expr.split()))
+    return len(set(pairs)) < len(pairs)
+
+
+def _compile(expr: str) -> ast.Expression:
+    node = ast.parse(expr, mode="eval")
+    node.cse = _subtree_keys(node) if _may_share(expr) else {}
+    return node
+
+
+# LRU of parsed expressions: expr -> [node, hits]. The hit counts decide
+# which entries are worth keeping in a session snapshot.
+PARSE_CACHE_SIZE = 256
+_parse_cache = OrderedDict()
+_parse_lock = threading.Lock()
+
+
+def _parse(expr: str, cache=True) -> ast.Expression:
+    """Parse an already preprocessed expression; cached on the whole string,
+    so text evaluated before (history recalls, repeated rows) skips the
+    parser. A new prefix of a cached expression is parsed from scratch.
+    With cache=False the cache is only read: no entry, hit or LRU move."""
+    with _parse_lock:
+        entry = _parse_cache.get(expr)
+        if entry is not None:
+            if cache:
+                _parse_cache.move_to_end(expr)
+                entry[1] += 1
+            return entry[0]
+    try:
+        node = _compile(expr)
+    except Exception:
+        _raise()
+    if not cache:
+        return node
+    with _parse_lock:
+        _parse_cache[expr] = [node, 0]
+        if len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return node
+
+
+def hot_expressions(limit=64):
+    """The most reused cached expressions as [expr, hits] pairs."""
+    with _parse_lock:
+        entries = [[expr, hits] for expr, (_, hits) in _parse_cache.items()]
+    entries.sort(key=lambda e: e[1], reverse=True)
+    return entries[:limit]
+
+
+def warm_parse_cache(entries):
+    """Re-parse expressions saved by hot_expressions(), keeping their hits."""
+    for entry in entries:
+        try:
+            expr, hits = entry
+            node = _compile(expr)
+        except Exception:
+            continue
+        with _parse_lock:
+            if expr not in _parse_cache:
+                _parse_cache[expr] = [node, hits]
+                _parse_cache.move_to_end(expr, last=False)
+            if len(_parse_cache) > PARSE_CACHE_SIZE:
+                _parse_cache.popitem(last=False)
+
+
+def safe_eval(expr: str, trig_in_degrees=False, variables=None, cache=True) -> float:
+    """
+    Safely evaluate a math expression with allowed names and functions.
+    Supports +, -, *, /, %, **, parentheses, and whitelisted functions.
+
+    trig_in_degrees: if True, converts numeric arguments of sin/cos/tan from degrees to radians.
+    variables: optional mapping of extra names (e.g. statistics results) usable in the expression.
+    cache: False for throwaway evaluations such as the live preview, which
+    must not fill the parse cache or count as reuse.
+    Subtrees repeated within the expression are evaluated once.
+    """
+    # Preprocess for power operator caret ^ -> **
+    expr = expr.replace("^", "**")
+
+    # Parse to AST
+    node = _parse(expr, cache)
+
+    # Common subexpressions: each repeated subtree is evaluated once
+    keys = node.cse
+    memo = {}
+
+    def memo_visit(n):
+        key = keys.get(id(n))
+        if key is None:
+            return evaluate(n)
+        try:
+            return memo[key]
+        except KeyError:
+            value = memo[key] = evaluate(n)
+            return value
+
+    def evaluate(n):
+        if isinstance(n, ast.Expression):
+            return visit(n.body)
+
+        elif isinstance(n, ast.Num):  # Python <3.8
+            return n.n
+
+        elif isinstance(n, ast.Constant):  # Python 3.8+
+            if isinstance(n.value, (int, float)):
+                return n.value
+            _raise()
+
+        elif isinstance(n, ast.BinOp) and isinstance(n.op, ALLOWED_BINOPS):
+            left = visit(n.left)
+            right = visit(n.right)
+            if np is not None and (isinstance(left, np.ndarray) or isinstance(right, np.ndarray)):
+                # Broadcasting can multiply sizes; check before allocating
+                _check_array_size(np.broadcast(left, right).size)
+            if isinstance(n.op, ast.Add):   return left + right
+            if isinstance(n.op, ast.Sub):   return left - right
+            if isinstance(n.op, ast.Mult):  return left * right
+            if isinstance(n.op, ast.Div):   return left / right
+            if isinstance(n.op, ast.Mod):   return left % right
+            if isinstance(n.op, ast.Pow):   return left ** right
+            _raise()
+
+        elif isinstance(n, ast.UnaryOp) and isinstance(n.op, ALLOWED_UNARYOPS):
+            operand = visit(n.operand)
+            if isinstance(n.op, ast.UAdd):  return +operand
+            if isinstance(n.op, ast.USub):  return -operand
+            _raise()
+
+        elif isinstance(n, ast.Name):
+            if n.id in ALLOWED_NAMES:
+                return ALLOWED_NAMES[n.id]
+            if variables and n.id in variables:
+                return variables[n.id]
+            _raise(f"Unknown name: {n.id}")
+
+        elif isinstance(n, ast.Call):
+            if not isinstance(n.func, ast.Name):
+                _raise()
+            func_name = n.func.id
+            if func_name not in ALLOWED_FUNCS and func_name not in LINALG_FUNCS:
+                _raise(f"Unknown function: {func_name}")
+            args = [visit(a) for a in n.args]
+            if func_name in LINALG_FUNCS:
+                func = LINALG_FUNCS[func_name]
+            elif np is not None and any(isinstance(a, np.ndarray) for a in args):
+                if func_name not in ARRAY_FUNCS:
+                    _raise(f"{func_name} does not accept arrays")
+                func = ARRAY_FUNCS[func_name]
+            else:
+                func = ALLOWED_FUNCS[func_name]
+            # Convert degrees to radians for trig
+            if func_name in ("sin", "cos", "tan") and trig_in_degrees:
+                if func is ALLOWED_FUNCS[func_name]:
+                    args = [math.radians(arg) for arg in args]
+                else:
+                    args = [np.radians(arg) for arg in args]
+            if func_name == "dot" and len(args) == 2:
+                _check_array_size(_dot_size(*args))
+            try:
+                result = func(*args)
+            except Exception:
+                _raise("Bad function arguments")
+            if np is not None and isinstance(result, np.ndarray):
+                _check_array_size(result.size)
+            return result
+
+        elif isinstance(n, ast.Expr):
+            return visit(n.value)
+
+        elif isinstance(n, ast.List):
+            if np is None:
+                _raise("Arrays require NumPy")
+            items = [visit(e) for e in n.elts]
+            try:
+                arr = np.array(items, dtype=float)
+            except Exception:
+                _raise("Invalid array")
+            _check_array_size(arr.size)
+            return arr
+
+        elif isinstance(n, ast.Tuple):
+            _raise()  # disallow tuples
+
+        else:
+            _raise()
+
+    # Skip the memo lookups entirely when nothing repeats
+    visit = memo_visit if keys else evaluate
+
+    if np is None:
+        return visit(node)
+    # Make NumPy fail like the scalar math functions instead of yielding nan/inf
+    with np.errstate(divide="raise", invalid="raise", over="raise"):
+        return visit(node)
+
+
+FLOAT_DIGITS = 309  # no finite float has more integer digits
+
+
+def _static_int(n, variables):
+    """Value of a literal or variable integer operand, else None."""
+    if isinstance(n, ast.UnaryOp) and isinstance(n.op, ALLOWED_UNARYOPS):
+        value = _static_int(n.operand, variables)
+        if value is not None and isinstance(n.op, ast.USub):
+            value = -value
+        return value
+    if isinstance(n, ast.Constant):
+        value = n.value
+    elif isinstance(n, ast.Name) and variables and n.id in variables:
+        value = variables[n.id]
+    else:
+        return None
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def digits_bound(expr: str, variables=None) -> float:
+    """
+    Upper bound on the decimal digits of the largest number safe_eval would
+    build for expr, found from the tree alone. Big powers and factorials
+    are the only things that get slow, and they are bounded from the digit
+    counts of their operands, so an expensive expression can be turned away
+    before it runs. May be math.inf; raises ValueError like safe_eval on bad
+    syntax. Reads the parse cache but never fills it.
+    """
+    node = _parse(expr.replace("^", "**"), cache=False)
+    peak = 1
+
+    def exponent_bound(n, digits):
+        # Magnitude bound of an operand, as a float (inf when out of range)
+        value = _static_int(n, variables)
+        if value is not None:
+            digits = estimate_digits(value)
+            return float(abs(value)) if digits < 300 else math.inf
+        return 10.0 ** digits if digits < 300 else math.inf
+
+    def bound(n):
+        # (digit bound, whether the value can be an int); only ints grow
+        # without limit, anything else overflows a float past FLOAT_DIGITS
+        nonlocal peak
+        if isinstance(n, (ast.Constant, ast.Name)):
+            value = n.value if isinstance(n, ast.Constant) else (variables or {}).get(n.id)
+            is_int = isinstance(value, int)
+            digits = estimate_digits(value) if is_int else FLOAT_DIGITS
+        elif isinstance(n, ast.UnaryOp):
+            digits, is_int = bound(n.operand)
+        elif isinstance(n, ast.BinOp):
+            (left, left_int), (right, right_int) = bound(n.left), bound(n.right)
+            is_int = left_int and right_int and not isinstance(n.op, ast.Div)
+            if isinstance(n.op, (ast.Add, ast.Sub)):
+                digits = max(left, right) + 1
+            elif isinstance(n.op, ast.Mult):
+                digits = left + right
+            elif isinstance(n.op, ast.Pow) and is_int:
+                digits = left * exponent_bound(n.right, right)
+            elif isinstance(n.op, ast.Mod):
+                digits = min(left, right)
+            else:
+                digits = FLOAT_DIGITS  # true division and float powers
+        elif isinstance(n, ast.Call):
+            args = [bound(a) for a in n.args]
+            func_name = n.func.id if isinstance(n.func, ast.Name) else None
+            if func_name == "factorial" and len(n.args) == 1:
+                # log10(x!) <= x * log10(x)
+                x = exponent_bound(n.args[0], args[0][0])
+                digits, is_int = (x * math.log10(x) + 1 if x > 1 else 1), True
+            elif func_name in ("abs", "floor", "ceil") and args:
+                digits = max(d for d, _ in args)
+                is_int = func_name != "abs" or all(i for _, i in args)
+            else:
+                digits, is_int = FLOAT_DIGITS, False
+        elif isinstance(n, ast.List):
+            for e in n.elts:
+                bound(e)
+            digits, is_int = FLOAT_DIGITS, False
+        else:
+            digits, is_int = 1, False  # rejected by safe_eval anyway
+        if not is_int:
+            digits = min(digits, FLOAT_DIGITS)
+        peak = max(peak, digits)
+        return digits, is_int
+
+    bound(node.body)
+    return peak
+
+
+def complete_partial(expr: str) -> str:
+    """
+    Turn a half-typed expression into something evaluable for the preview:
+    drop a dangling operator and close any open parentheses/brackets.
+    """
+    expr = expr.rstrip()
+    while expr and expr[-1] in "+-*/%^([,":
+        expr = expr[:-1].rstrip()
+    closers = {"(": ")", "[": "]"}
+    stack = []
+    for ch in expr:
+        if ch in closers:
+            stack.append(closers[ch])
+        elif stack and ch == stack[-1]:
+            stack.pop()
+    return expr + "".join(reversed(stack))
+
+
+# -------------------------------
+# Result formatting
+# -------------------------------
+DISPLAY_MAX_DIGITS = 4300   # integers longer than this are shown in scientific notation
+COMPACT_MAX_DIGITS = 30     # longer integers are summarised in history, labels and previews
+SCI_DIGITS = 12             # significant digits in scientific notation
+EDGE_DIGITS = 10            # leading/trailing digits kept in the truncated view
+
+_LOG10_2 = math.log10(2)
+
+
+def estimate_digits(n: int) -> int:
+    """Decimal digit count of |n| from its bit length, without converting.
+    May overestimate by one."""
+    return int(abs(n).bit_length() * _LOG10_2) + 1
+
+
+def exceeds_digits(n: int, limit: int) -> bool:
+    """Whether |n| has more than `limit` decimal digits. Exact: the estimate
+    decides except right at the boundary, where one power of ten settles it."""
+    estimate = estimate_digits(n)
+    if estimate != limit + 1:
+        return estimate > limit
+    return abs(n) >= 10 ** limit
+
+
+def _int_to_decimal(n: int) -> decimal.Decimal:
+    """Exact int -> Decimal conversion, splitting on bit halves so the heavy
+    lifting is done by libmpdec's subquadratic multiplication."""
+    D2 = decimal.Decimal(2)
+    pow2_cache = {}
+
+    def pow2(w):
+        result = pow2_cache.get(w)
+        if result is None:
+            result = pow2_cache[w] = D2 ** w
+        return result
+
+    def inner(n, w):
+        if w <= 1024:
+            return decimal.Decimal(n)
+        w2 = w >> 1
+        hi = n >> w2
+        lo = n - (hi << w2)
+        return inner(lo, w2) + inner(hi, w - w2) * pow2(w2)
+
+    with decimal.localcontext() as ctx:
+        ctx.prec = decimal.MAX_PREC
+        ctx.Emax = decimal.MAX_EMAX
+        ctx.Emin = decimal.MIN_EMIN
+        ctx.traps[decimal.Inexact] = True
+        return inner(n, n.bit_length())
+
+
+def int_to_str(n: int) -> str:
+    """Full decimal expansion of n; not subject to the int-to-str digit limit."""
+    if n.bit_length() <= 1024:
+        return str(n)
+    if n < 0:
+        return "-" + str(_int_to_decimal(-n))
+    return str(_int_to_decimal(n))
+
+
+def _int_scientific(n: int, digits=SCI_DIGITS) -> str:
+    # Only the top 64 bits matter for the leading digits
+    sign = "-" if n < 0 else ""
+    n = abs(n)
+    shift = max(n.bit_length() - 64, 0)
+    with decimal.localcontext() as ctx:
+        ctx.prec = digits + 10
+        ctx.Emax = decimal.MAX_EMAX
+        value = decimal.Decimal(n >> shift) * decimal.Decimal(2) ** shift
+        return sign + f"{value:.{digits - 1}e}"
+
+
+def _leading_digits(n: int, digits: int):
+    """
+    First `digits` digits of n > 0 (truncated, not rounded) and its exact
+    digit count. n is bracketed between two 64-bit approximations; only when
+    they disagree is the full expansion needed.
+    """
+    shift = max(n.bit_length() - 64, 0)
+    top = n >> shift
+    bounds = []
+    with decimal.localcontext() as ctx:
+        ctx.prec = digits + 20
+        ctx.Emax = decimal.MAX_EMAX
+        ctx.rounding = decimal.ROUND_DOWN
+        for approx in (top, top + 1 if shift else top):
+            value = decimal.Decimal(approx) * decimal.Decimal(2) ** shift
+            _, value_digits, _ = value.as_tuple()
+            bounds.append(("".join(map(str, value_digits[:digits])), value.adjusted() + 1))
+    if bounds[0] == bounds[1]:
+        return bounds[0]
+    full = int_to_str(n)
+    return full[:digits], len(full)
+
+
+def format_result(result) -> str:
+    """Short display form of a result, cheap even for huge integers."""
+    if np is not None and isinstance(result, np.ndarray):
+        text = np.array2string(result, separator=", ", threshold=100)
+        return text.replace("\n", "")
+    if isinstance(result, float):
+        if result.is_integer() and abs(result) < 10 ** DISPLAY_MAX_DIGITS:
+            return str(int(result))
+        return str(result)
+    if isinstance(result, int):
+        if exceeds_digits(result, DISPLAY_MAX_DIGITS):
+            return _int_scientific(result)
+        return int_to_str(result)
+    return str(result)
+
+
+def format_compact(result) -> str:
+    """Like format_result, but long integers are reduced to their truncated view."""
+    if isinstance(result, int) and exceeds_digits(result, COMPACT_MAX_DIGITS):
+        return format_truncated(result)
+    return format_result(result)
+
+
+def format_truncated(n: int) -> str:
+    """Leading and trailing digits of a huge integer plus its digit count."""
+    sign = "-" if n < 0 else ""
+    n = abs(n)
+    leading, count = _leading_digits(n, EDGE_DIGITS)
+    trailing = str(n % 10 ** EDGE_DIGITS).zfill(EDGE_DIGITS)
+    return f"{sign}{leading}…{trailing} ({count} digits)"
+
+
+# -------------------------------
+# Streaming statistics
+# -------------------------------
+class P2Quantile:
+    """
+    Single quantile estimated with the P² algorithm (Jain & Chlamtac):
+    five markers, constant memory, no stored samples.
+    """
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def push(self, x):
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        pos = self.positions
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Nudge the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qn = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < qn < q[i + 1]:
+                    qn = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qn
+                pos[i] += d
+
+    def value(self):
+        q = self.heights
+        if not q:
+            return math.nan
+        if len(q) < 5:
+            # Still exact: the first few samples are kept sorted
+            return q[round(self.p * (len(q) - 1))]
+        return q[2]
+
+
+class RunningStats:
+    """
+    One-pass, constant-memory aggregates: Neumaier-compensated sum, Welford
+    mean/variance, min/max and P² quartiles.
+    """
+    __slots__ = ("count", "_sum", "_comp", "_mean", "_m2", "min", "max", "_quantiles")
+
+    QUANTILES = {"q1": 0.25, "median": 0.5, "q3": 0.75}
+
+    def __init__(self):
+        self.count = 0
+        self._sum = 0.0
+        self._comp = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._quantiles = {name: P2Quantile(p) for name, p in self.QUANTILES.items()}
+
+    def push(self, x):
+        self.count += 1
+
+        # Neumaier summation
+        t = self._sum + x
+        if abs(self._sum) >= abs(x):
+            self._comp += (self._sum - t) + x
+        else:
+            self._comp += (x - t) + self._sum
+        self._sum = t
+
+        # Welford
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        for q in self._quantiles.values():
+            q.push(x)
+
+    def extend(self, values):
+        for x in values:
+            self.push(x)
+        return self
+
+    @property
+    def total(self):
+        return self._sum + self._comp
+
+    @property
+    def mean(self):
+        # The compensated sum is more accurate than Welford's running mean
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    def as_variables(self):
+        """Results keyed by the names they can be used under in expressions."""
+        return _stats_variables(self, {name: q.value() for name, q in self._quantiles.items()})
+
+
+class ChunkedStats:
+    """
+    NumPy counterpart of RunningStats for large inputs, fed whole arrays:
+    chunk moments merged with Chan et al.'s pairwise formulas, chunk sums
+    from math.fsum accumulated with Neumaier, and quartiles read from a
+    fixed-size uniform sample (bottom-k random priorities). Memory stays
+    bounded by the chunk and sample sizes.
+    """
+    __slots__ = ("count", "_sum", "_comp", "_mean", "_m2", "min", "max",
+                 "_sample", "_priorities", "_rng")
+
+    QUANTILES = RunningStats.QUANTILES
+    SAMPLE_SIZE = 65536
+
+    def __init__(self, seed=0):
+        self.count = 0
+        self._sum = 0.0
+        self._comp = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._sample = np.empty(0)
+        self._priorities = np.empty(0)
+        self._rng = np.random.default_rng(seed)
+
+    def push_chunk(self, values):
+        n = values.size
+        if not n:
+            return
+
+        chunk_sum = math.fsum(values.tolist())
+        t = self._sum + chunk_sum
+        if abs(self._sum) >= abs(chunk_sum):
+            self._comp += (self._sum - t) + chunk_sum
+        else:
+            self._comp += (chunk_sum - t) + self._sum
+        self._sum = t
+
+        # Chan: merge (count, mean, M2) of the running set and the chunk
+        chunk_mean = chunk_sum / n
+        deviations = values - chunk_mean
+        chunk_m2 = float(np.dot(deviations, deviations))
+        total = self.count + n
+        delta = chunk_mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        # Keep the SAMPLE_SIZE values with the smallest random priorities
+        sample = np.concatenate((self._sample, values))
+        priorities = np.concatenate((self._priorities, self._rng.random(n)))
+        if sample.size > self.SAMPLE_SIZE:
+            keep = np.argpartition(priorities, self.SAMPLE_SIZE)[:self.SAMPLE_SIZE]
+            sample = sample[keep]
+            priorities = priorities[keep]
+        self._sample = sample
+        self._priorities = priorities
+
+    def extend_chunks(self, chunks):
+        for chunk in chunks:
+            self.push_chunk(chunk)
+        return self
+
+    total = RunningStats.total
+    mean = RunningStats.mean
+    variance = RunningStats.variance
+    stdev = RunningStats.stdev
+
+    def as_variables(self):
+        """Results keyed by the names they can be used under in expressions."""
+        if self._sample.size:
+            quantiles = {name: float(np.quantile(self._sample, p))
+                         for name, p in self.QUANTILES.items()}
+        else:
+            quantiles = {name: math.nan for name in self.QUANTILES}
+        return _stats_variables(self, quantiles)
+
+
+def _stats_variables(stats, quantiles):
+    result = {
+        "count": stats.count,
+        "total": stats.total,
+        "mean": stats.mean,
+        "var": stats.variance,
+        "stdev": stats.stdev,
+        "min": stats.min,
+        "max": stats.max,
+    }
+    result.update(quantiles)
+    return result
+
+
+_NUMBER_SEP = re.compile(r"[\s,;]+")
+STATS_CHUNK_LINES = 65536
+
+
+def iter_numbers(lines, start=1):
+    """
+    Yield floats from an iterable of text lines (a file, stdin or a pasted
+    list), separated by whitespace, commas or semicolons. nan and inf are
+    rejected: one of them would silently poison every aggregate.
+    """
+    for lineno, line in enumerate(lines, start):
+        for token in _NUMBER_SEP.split(line.strip()):
+            if not token:
+                continue
+            try:
+                value = float(token)
+            except ValueError:
+                _raise(f"Not a number on line {lineno}: {token}")
+            if not math.isfinite(value):
+                _raise(f"Not a finite number on line {lineno}: {token}")
+            yield value
+
+
+def iter_number_chunks(lines, size=STATS_CHUNK_LINES):
+    """
+    Like iter_numbers, but yields float64 arrays of up to `size` lines,
+    converted by NumPy in one call per chunk.
+    """
+    lines = iter(lines)
+    lineno = 1
+    while True:
+        block = list(itertools.islice(lines, size))
+        if not block:
+            return
+        tokens = [t for t in _NUMBER_SEP.split(" ".join(block)) if t]
+        try:
+            values = np.array(tokens, dtype=float)
+        except ValueError:
+            values = None
+        if values is None or not np.isfinite(values).all():
+            # Slow path: reports the offending line, or parses what NumPy would not
+            values = np.fromiter(iter_numbers(block, lineno), dtype=float)
+        lineno += len(block)
+        yield values
+
+
+def stats_from_lines(lines):
+    """Aggregate numbers from text lines; vectorised when NumPy is available."""
+    if np is None:
+        return RunningStats().extend(iter_numbers(lines))
+    return ChunkedStats().extend_chunks(iter_number_chunks(lines))
+
+
+def stats_from_file(path):
+    """Stream a file (or "-" for stdin) through stats_from_lines."""
+    if path == "-":
+        return stats_from_lines(sys.stdin)
+    with open(path, encoding="utf-8") as f:
+        return stats_from_lines(f)
+
+
+# -------------------------------
+# Batch evaluation to binary buffers
+# -------------------------------
+# Batch file layout: 16-byte header, `count` float64 values, then a validity
+# bitmap of ceil(count / 8) bytes (bit i of byte i // 8 set when row i
+# evaluated). Values and count use the byte order recorded in the header.
+BATCH_HEADER = struct.Struct("=7scQ")
+BATCH_MAGIC = b"ADVCALC"
+_BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+# Buffer formats of native doubles; NumPy spells out the byte order
+_DOUBLE_FORMATS = ("d", "@d", "=d", _BYTE_ORDER.decode() + "d")
+
+
+def eval_batch(expressions, out, valid, trig_in_degrees=False, variables=None) -> int:
+    """
+    Evaluate expressions straight into preallocated buffers.
+
+    out: writable buffer of native doubles (array('d'), a float64 NumPy
+    array, a memoryview cast to "d"...); anything else raises TypeError.
+    Failed rows are written as NaN.
+    valid: writable byte buffer of at least ceil(len(out) / 8) bytes that
+    receives the validity bitmap.
+    Returns the number of rows written.
+    """
+    with memoryview(out) as raw:
+        if raw.format not in _DOUBLE_FORMATS or raw.itemsize != 8:
+            raise TypeError(f"out must hold native doubles, not format {raw.format!r}")
+        # Through bytes so NumPy's explicit byte order is accepted
+        with raw.cast("B") as raw_bytes, raw_bytes.cast("d") as values, \
+                memoryview(valid) as bits:
+            capacity = len(values)
+            byte = 0
+            count = 0
+            for i, expr in enumerate(expressions):
+                if i >= capacity:
+                    _raise("More expressions than output slots")
+                try:
+                    values[i] = float(safe_eval(expr, trig_in_degrees=trig_in_degrees,
+                                                variables=variables))
+                    byte |= 1 << (i & 7)
+                except Exception:
+                    values[i] = math.nan
+                if i & 7 == 7:
+                    bits[i >> 3] = byte
+                    byte = 0
+                count = i + 1
+            if count & 7:
+                bits[count >> 3] = byte
+            return count
+
+
+def _count_lines(path):
+    # Only "\n" ends a line; "\r\n" is stripped as trailing whitespace
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return lines if last == b"\n" else lines + 1
+
+
+def write_batch_file(src, dst, trig_in_degrees=False, variables=None) -> int:
+    """
+    Evaluate every line of `src` and write the results to `dst` in the
+    batch file layout, through a memory map. Returns the row count.
+    """
+    count = _count_lines(src)
+    values_end = BATCH_HEADER.size + 8 * count
+    size = values_end + (count + 7) // 8
+    with open(dst, "w+b") as f:
+        f.truncate(max(size, 1))
+        with mmap.mmap(f.fileno(), 0) as mm:
+            BATCH_HEADER.pack_into(mm, 0, BATCH_MAGIC, _BYTE_ORDER, count)
+            # newline="\n" splits lines exactly where _count_lines counts them
+            with open(src, encoding="utf-8", newline="\n") as lines, memoryview(mm) as view:
+                exprs = (line.strip() for line in lines)
+                # Released on the way out even on error: a live export would
+                # make closing the mmap fail and mask the error
+                with view[BATCH_HEADER.size:values_end] as raw_values, \
+                        raw_values.cast("d") as values, view[values_end:size] as bits:
+                    eval_batch(exprs, values, bits,
+                               trig_in_degrees=trig_in_degrees, variables=variables)
+            mm.flush()
+        f.truncate(size)
+    return count
+
+
+def open_batch_file(path):
+    """
+    Map a batch file read-only and return (values, valid) memoryviews over
+    it without copying. Row i is valid when valid[i >> 3] >> (i & 7) & 1.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, order, count = BATCH_HEADER.unpack_from(mm, 0)
+    if magic != BATCH_MAGIC or order != _BYTE_ORDER:
+        mm.close()
+        _raise("Not a batch file for this platform")
+    view = memoryview(mm)
+    values_end = BATCH_HEADER.size + 8 * count
+    return view[BATCH_HEADER.size:values_end].cast("d"), view[values_end:values_end + (count + 7) // 8]
+
+
+# -------------------------------
+# Calculator session (no GUI)
+# -------------------------------
+SESSION_HISTORY_LIMIT = 500
+
+
+class CalculatorSession:
+    """
+    State of one calculator - memory, ANS, angle mode, statistics variables
+    and history - with the button operations as methods. It holds no
+    widgets, so a process can host many sessions; the Tk front-ends are
+    views over one.
+
+    Errors surface as ValueError (ZeroDivisionError for 1/0), like safe_eval.
+    """
+    __slots__ = ("memory", "last_answer", "trig_in_degrees", "variables", "_history")
+
+    def __init__(self, trig_in_degrees=True):
+        self.memory = 0.0
+        self.last_answer = 0.0
+        self.trig_in_degrees = trig_in_degrees
+        self.variables = {}
+        self._history = None  # created on first entry
+
+    # Evaluation
+    def names(self):
+        """Extra names visible to expressions: ANS plus statistics results."""
+        return dict(self.variables, ANS=self.last_answer)
+
+    def _value(self, expr):
+        return float(safe_eval(expr, trig_in_degrees=self.trig_in_degrees, variables=self.names()))
+
+    def evaluate(self, expr):
+        """Evaluate expr, store it as ANS and record it in the history."""
+        result = safe_eval(expr, trig_in_degrees=self.trig_in_degrees, variables=self.names())
+        self.last_answer = result
+        self.add_history(expr, result)
+        return result
+
+    # Buttons
+    def square(self, expr):
+        result = self._value(expr) ** 2
+        self.add_history(f"({expr})²", result)
+        return result
+
+    def sqrt(self, expr):
+        value = self._value(expr)
+        if value < 0:
+            _raise("Cannot take square root of negative number")
+        result = math.sqrt(value)
+        self.add_history(f"√({expr})", result)
+        return result
+
+    def reciprocal(self, expr):
+        value = self._value(expr)
+        if value == 0:
+            raise ZeroDivisionError("Division by zero")
+        result = 1 / value
+        self.add_history(f"1/({expr})", result)
+        return result
+
+    def percentage(self, expr):
+        """
+        Percent relative to the left operand: "200+10" -> 220, "200*10" -> 20;
+        a lone value is divided by 100.
+        """
+        for i in range(len(expr) - 1, 0, -1):
+            operator = expr[i]
+            if operator in "+-*/":
+                base = self._value(expr[:i])
+                perc = self._value(expr[i + 1:]) / 100
+                if operator == "+":
+                    return base + base * perc
+                if operator == "-":
+                    return base - base * perc
+                if operator == "*":
+                    return base * perc
+                return base / perc
+        return self._value(expr) / 100
+
+    # Memory keys
+    def memory_add(self, value):
+        self.memory += value
+
+    def memory_subtract(self, value):
+        self.memory -= value
+
+    def memory_recall(self):
+        return self.memory
+
+    def memory_clear(self):
+        self.memory = 0.0
+
+    # Mode
+    def toggle_mode(self):
+        self.trig_in_degrees = not self.trig_in_degrees
+
+    # History
+    @property
+    def history(self):
+        """(expression, result text) pairs, oldest first."""
+        return self._history if self._history is not None else ()
+
+    def add_history(self, expr, result):
+        """Record a line; long integers are stored in their truncated form."""
+        text = format_compact(result)
+        if self._history is None:
+            self._history = deque(maxlen=SESSION_HISTORY_LIMIT)
+        self._history.append((str(expr), text))
+        return text
+
+    def clear_history(self):
+        self._history = None
+
+
+# -------------------------------
+# Session snapshots
+# -------------------------------
+SESSION_PATH = os.path.join(os.path.expanduser("~"), ".adv_calculator", "session.json.gz")
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HISTORY_LIMIT = 500
+
+
+def save_snapshot(state, path=SESSION_PATH):
+    """Write a gzip'd JSON snapshot atomically (temp file + rename)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(dict(state, version=SNAPSHOT_VERSION), f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_snapshot(path=SESSION_PATH):
+    """Read a snapshot; None if missing, unreadable or from another version."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, EOFError, ValueError, zlib.error):
+        # Missing, truncated or corrupt: start cold
+        return None
+    if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+        return None
+    return state
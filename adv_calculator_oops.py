@@ -1,122 +1,49 @@
 #!/usr/bin/env python3
-import math
+import argparse
+import sys
 import time
-import ast
 import tkinter as tk
-from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, ttk
+
+from adv_calculator_core import (
+    DISPLAY_MAX_DIGITS,
+    SNAPSHOT_HISTORY_LIMIT,
+    CalculatorSession,
+    complete_partial,
+    digits_bound,
+    estimate_digits,
+    exceeds_digits,
+    format_compact,
+    format_result,
+    hot_expressions,
+    int_to_str,
+    load_snapshot,
+    safe_eval,
+    save_snapshot,
+    stats_from_file,
+    stats_from_lines,
+    warm_parse_cache,
+    write_batch_file,
+)
 
 # -------------------------------
-# Safe expression evaluator (AST)
+# UI: Modern Tkinter (ttk themed)
 # -------------------------------
-ALLOWED_NAMES = {
-    "pi": math.pi,
-    "e": math.e,
-}
-
-ALLOWED_FUNCS = {
-    "sin": math.sin,
-    "cos": math.cos,
-    "tan": math.tan,
-    "log": math.log10,  # log base 10
-    "ln": math.log,     # natural log
-    "sqrt": math.sqrt,
-    "abs": abs,
-    "floor": math.floor,
-    "ceil": math.ceil,
-    "factorial": math.factorial,
-}
-
-ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow)
-ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
-
-
-def _raise(msg="Invalid expression"):
-    raise ValueError(msg)
-
-
-def safe_eval(expr: str, trig_in_degrees=False) -> float:
-    """
-    Safely evaluate a math expression with allowed names and functions.
-    Supports +, -, *, /, %, **, parentheses, and whitelisted functions.
-
-    trig_in_degrees: if True, converts numeric arguments of sin/cos/tan from degrees to radians.
-    """
-    # Preprocess for power operator caret ^ -> **
-    expr = expr.replace("^", "**")
-
-    # Parse to AST
-    try:
-        node = ast.parse(expr, mode="eval")
-    except Exception:
-        _raise()
-
-    def visit(n):
-        if isinstance(n, ast.Expression):
-            return visit(n.body)
-
-        elif isinstance(n, ast.Num):  # Python <3.8
-            return n.n
-
-        elif isinstance(n, ast.Constant):  # Python 3.8+
-            if isinstance(n.value, (int, float)):
-                return n.value
-            _raise()
-
-        elif isinstance(n, ast.BinOp) and isinstance(n.op, ALLOWED_BINOPS):
-            left = visit(n.left)
-            right = visit(n.right)
-            if isinstance(n.op, ast.Add):   return left + right
-            if isinstance(n.op, ast.Sub):   return left - right
-            if isinstance(n.op, ast.Mult):  return left * right
-            if isinstance(n.op, ast.Div):   return left / right
-            if isinstance(n.op, ast.Mod):   return left % right
-            if isinstance(n.op, ast.Pow):   return left ** right
-            _raise()
-
-        elif isinstance(n, ast.UnaryOp) and isinstance(n.op, ALLOWED_UNARYOPS):
-            operand = visit(n.operand)
-            if isinstance(n.op, ast.UAdd):  return +operand
-            if isinstance(n.op, ast.USub):  return -operand
-            _raise()
-
-        elif isinstance(n, ast.Name):
-            if n.id in ALLOWED_NAMES:
-                return ALLOWED_NAMES[n.id]
-            _raise(f"Unknown name: {n.id}")
-
-        elif isinstance(n, ast.Call):
-            if not isinstance(n.func, ast.Name):
-                _raise()
-            func_name = n.func.id
-            if func_name not in ALLOWED_FUNCS:
-                _raise(f"Unknown function: {func_name}")
-            args = [visit(a) for a in n.args]
-            # Convert degrees to radians for trig
-            if func_name in ("sin", "cos", "tan") and trig_in_degrees:
-                args = [math.radians(arg) for arg in args]
-            try:
-                return ALLOWED_FUNCS[func_name](*args)
-            except Exception:
-                _raise("Bad function arguments")
+PREVIEW_DELAY_MS = 150      # quiet period after the last edit before previewing
+PREVIEW_POLL_MS = 20        # how often the UI checks for a finished preview
+PREVIEW_MAX_LEN = 4000      # longer input is only evaluated on "="
+# Previews that would build a number with more digits than this are skipped
+PREVIEW_MAX_DIGITS = 200_000
 
-        elif isinstance(n, ast.Expr):
-            return visit(n.value)
 
-        elif isinstance(n, ast.Tuple):
-            _raise()  # disallow tuples
-
-        else:
-            _raise()
+def _is_unset(value):
+    """Whether a session value still holds its 0.0 default."""
+    return type(value) is float and value == 0.0
 
-    result = visit(node)
-    return result
 
-
-# -------------------------------
-# UI: Modern Tkinter (ttk themed)
-# -------------------------------
 class CalculatorApp:
-    def __init__(self, root):
+    def __init__(self, root, session=None):
         self.root = root
         self.root.title("Advanced Calculator")
         self.root.geometry("520x520")
@@ -125,17 +52,39 @@ class CalculatorApp:
         self.root.bind("<Control-t>", self.toggle_theme_event)
         self.root.bind("<Control-d>", self.set_degrees_event)
         self.root.bind("<Control-r>", self.set_radians_event)
+        self.root.bind("<Control-e>", self.copy_full_result_event)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        # State
-        self.memory = 0.0
-        self.trig_in_degrees = True
+        # State: calculator state lives in the session, this class only shows it
+        self.session = session or CalculatorSession()
         self.history_visible = True
         self.theme = "dark"
 
+        # Live preview: one background worker, a pending debounce timer and
+        # a generation counter so results of stale evaluations are dropped.
+        self._preview_executor = ThreadPoolExecutor(max_workers=1)
+        self._preview_after_id = None
+        self._preview_future = None
+        self._preview_generation = 0
+
+        # Long-running jobs (digit expansion, statistics) that must not block previews
+        self._background_executor = ThreadPoolExecutor(max_workers=1)
+        # Keystrokes typed outside the entry, flushed once per idle cycle
+        self._pending_input = []
+
         self._configure_style()
         self._build_layout()
         self._bind_keys()
         self.just_evaluated = False
+        self.mode_var.set("Degrees" if self.session.trig_in_degrees else "Radians")
+        for expr, text in self.session.history:
+            self._show_history(expr, text)
+
+        # Previous session: read off the UI thread, applied once available.
+        # A session handed in by the caller already has its state.
+        if session is None:
+            future = self._background_executor.submit(load_snapshot)
+            self.root.after(PREVIEW_POLL_MS, self._poll_snapshot, future)
 
     def _configure_style(self):
         self.style = ttk.Style()
@@ -189,6 +138,7 @@ class CalculatorApp:
             self.style.configure("History.TFrame", background=surface)
             self.style.configure("History.TLabel", background=surface, foreground=text)
             self.style.configure("History.TButton", background=surface, foreground=text, padding=6)
+            self.style.configure("Preview.TLabel", background=surface, foreground="#9AA0AA")
         else:
             bg = "#F7F7F7"
             surface = "#FFFFFF"
@@ -232,6 +182,7 @@ class CalculatorApp:
             self.style.configure("History.TFrame", background=surface)
             self.style.configure("History.TLabel", background=surface, foreground=text)
             self.style.configure("History.TButton", background=surface, foreground=text, padding=6)
+            self.style.configure("Preview.TLabel", background=surface, foreground="#777")
 
     def _build_layout(self):
         # Top bar
@@ -253,6 +204,10 @@ class CalculatorApp:
         self.history_btn = ttk.Button(top, text="Toggle history", style="Calc.TButton", command=self.toggle_history)
         self.history_btn.pack(side="left", padx=(6, 0))
 
+        # Statistics over a pasted list or a file
+        self.stats_btn = ttk.Button(top, text="Stats", style="Calc.TButton", command=self.run_stats)
+        self.stats_btn.pack(side="left", padx=(6, 0))
+
         # Display
         display_frame = ttk.Frame(self.root, style="Surface.TFrame")
         display_frame.pack(fill="x", padx=12, pady=(6, 12))
@@ -261,6 +216,13 @@ class CalculatorApp:
         self.entry.pack(fill="x", padx=8, pady=8)
         self.entry.focus_set()
 
+        # Live result preview
+        self.preview_var = tk.StringVar(value="")
+        self.preview_label = ttk.Label(display_frame, textvariable=self.preview_var,
+                                       style="Preview.TLabel", anchor="e")
+        self.preview_label.pack(fill="x", padx=8, pady=(0, 8))
+        self.entry_var.trace_add("write", self._schedule_preview)
+
         # Error label
         self.error_var = tk.StringVar(value="")
         self.error_label = ttk.Label(self.root, textvariable=self.error_var, style="TLabel")
@@ -324,6 +286,8 @@ class CalculatorApp:
         self.root.bind("<BackSpace>", self._backspace_event)
         self.root.bind("<Delete>", self._clear_event)
         self.root.bind("<Escape>", self._clear_event)
+        self.root.bind("<<Paste>>", self._paste_event)
+        self.entry.bind("<Key>", self._entry_key)
 
         # Function shortcuts: type name + ( )
         # You can type sin(45) directly; no special bindings needed.
@@ -354,24 +318,62 @@ class CalculatorApp:
 
     def _insert_char(self, event):
         self.error_var.set("")
-        self.insert_text(event.char)
+        if event.widget is self.entry:
+            return  # the entry's own binding already inserted it at the cursor
+        self._queue_input(event.char)
+
+    def _entry_key(self, event):
+        # Typing into the entry right after a result starts a new expression
+        if self.just_evaluated and event.char and event.char.isprintable():
+            self.entry_var.set("")
+            self.just_evaluated = False
+
+    def _queue_input(self, text):
+        # A burst of key events becomes a single insert
+        if not self._pending_input:
+            self.root.after_idle(self._flush_input)
+        self._pending_input.append(text)
+
+    def _flush_input(self):
+        if self._pending_input:
+            text = "".join(self._pending_input)
+            self._pending_input.clear()
+            self.insert_text(text)
 
     def insert_text(self, text):
+        self._flush_input()
         # If last action was evaluation, clear before inserting
         if self.just_evaluated:
             self.entry_var.set("")
             self.just_evaluated = False
-        self.entry.insert(tk.END, text)
+        self.entry.insert(tk.INSERT, text)
+
+    def _paste_event(self, event):
+        if event.widget is self.entry:
+            return  # pasted natively at the cursor
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return
+        self.insert_text(text.replace("\n", "").replace("\r", ""))
 
     def backspace(self):
-        s = self.entry_var.get()
-        if s:
-            self.entry_var.set(s[:-1])
+        self._flush_input()
+        # Edit in place: remove the selection or the character before the cursor
+        if self.entry.selection_present():
+            self.entry.delete(tk.SEL_FIRST, tk.SEL_LAST)
+            return
+        pos = self.entry.index(tk.INSERT)
+        if pos:
+            self.entry.delete(pos - 1)
 
-    def _backspace_event(self, _):
+    def _backspace_event(self, event):
+        if event.widget is self.entry:
+            return  # handled by the entry itself
         self.backspace()
 
     def clear(self):
+        self._pending_input.clear()
         self.entry_var.set("")
         self.error_var.set("")
 
@@ -379,18 +381,18 @@ class CalculatorApp:
         self.clear()
 
     def evaluate(self):
+        self._flush_input()
         expr = self.entry_var.get().strip()
         if not expr:
             return
         try:
-            result = safe_eval(expr, trig_in_degrees=self.trig_in_degrees)
-            if isinstance(result, float) and result.is_integer():
-                display = str(int(result))
+            result = self.session.evaluate(expr)
+            self.entry_var.set(format_result(result))
+            if isinstance(result, int) and exceeds_digits(result, DISPLAY_MAX_DIGITS):
+                self.error_var.set("Ctrl+E copies all digits; ANS keeps the exact value")
             else:
-                display = str(result)
-            self.entry_var.set(display)
-            self.error_var.set("")
-            self.add_history(expr, display)
+                self.error_var.set("")
+            self._show_history(*self.session.history[-1])
             self.just_evaluated = True   # <-- mark evaluation
         except Exception as e:
             self.error_var.set(str(e) or "Invalid expression")
@@ -399,20 +401,203 @@ class CalculatorApp:
     def _evaluate_event(self, _):
         self.evaluate()
 
+    # -------------------------------
+    # Live preview
+    # -------------------------------
+    def _schedule_preview(self, *_):
+        # Debounce: restart the timer on every edit
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.root.after(PREVIEW_DELAY_MS, self._start_preview)
+
+    def _start_preview(self):
+        self._preview_after_id = None
+        self._preview_generation += 1
+        # A queued evaluation that has not started yet is no longer needed
+        if self._preview_future is not None:
+            self._preview_future.cancel()
+            self._preview_future = None
+
+        expr = complete_partial(self.entry_var.get())
+        if self.just_evaluated or not expr or len(expr) > PREVIEW_MAX_LEN:
+            self.preview_var.set("")
+            return
+
+        # The worker holds the GIL while it multiplies big integers, so
+        # anything that would build a huge number is left for "=" instead
+        variables = self.session.names()
+        try:
+            too_large = digits_bound(expr, variables) > PREVIEW_MAX_DIGITS
+        except ValueError:
+            too_large = True  # does not parse; nothing to preview
+        if too_large:
+            self.preview_var.set("")
+            return
+
+        self._preview_future = self._preview_executor.submit(
+            safe_eval, expr, trig_in_degrees=self.session.trig_in_degrees,
+            variables=variables, cache=False)
+        self.root.after(PREVIEW_POLL_MS, self._poll_preview,
+                        self._preview_future, self._preview_generation)
+
+    def _poll_preview(self, future, generation):
+        if generation != self._preview_generation:
+            return  # superseded by a newer edit
+        if not future.done():
+            self.root.after(PREVIEW_POLL_MS, self._poll_preview, future, generation)
+            return
+        self._preview_future = None
+        try:
+            result = future.result()
+        except Exception:
+            self.preview_var.set("")
+            return
+        self.preview_var.set(f"= {format_compact(result)}")
+
+    # -------------------------------
+    # Full-precision result
+    # -------------------------------
+    def copy_full_result(self):
+        result = self.session.last_answer
+        if not isinstance(result, int):
+            return
+        self.error_var.set(f"Expanding ~{estimate_digits(result)} digits...")
+        future = self._background_executor.submit(int_to_str, result)
+        self.root.after(PREVIEW_POLL_MS, self._poll_full_result, future)
+
+    def _poll_full_result(self, future):
+        if not future.done():
+            self.root.after(PREVIEW_POLL_MS, self._poll_full_result, future)
+            return
+        digits = future.result()
+        self.root.clipboard_clear()
+        self.root.clipboard_append(digits)
+        self.error_var.set(f"Copied {len(digits.lstrip('-'))} digits")
+
+    def copy_full_result_event(self, _):
+        self.copy_full_result()
+
+    # -------------------------------
+    # Session snapshot
+    # -------------------------------
+    def snapshot(self):
+        last = self.session.last_answer
+        if isinstance(last, int) and exceeds_digits(last, DISPLAY_MAX_DIGITS):
+            last = None  # too large for JSON; the history keeps its summary
+        elif not isinstance(last, (int, float)):
+            last = None
+        return {
+            "memory": self.session.memory,
+            "last_result": last,
+            "trig_in_degrees": self.session.trig_in_degrees,
+            "theme": self.theme,
+            "variables": self.session.variables,
+            "history": list(self.history_list.get(0, tk.END))[-SNAPSHOT_HISTORY_LIMIT:],
+            "hot_expressions": hot_expressions(),
+        }
+
+    def _poll_snapshot(self, future):
+        if not future.done():
+            self.root.after(PREVIEW_POLL_MS, self._poll_snapshot, future)
+            return
+        state = future.result()
+        if state:
+            self.restore(state)
+
+    def restore(self, state):
+        # Cheap scalar state first so the calculator is usable right away.
+        # Anything the user already changed before the snapshot arrived wins,
+        # so each value is only applied while it still has its default.
+        # Type checks first: memory and ANS may be arrays by now.
+        session = self.session
+        if _is_unset(session.memory):
+            try:
+                session.memory = float(state.get("memory", 0.0))
+            except (TypeError, ValueError):
+                pass
+        last = state.get("last_result")
+        if _is_unset(session.last_answer) and isinstance(last, (int, float)):
+            session.last_answer = last
+        variables = state.get("variables")
+        if not session.variables and isinstance(variables, dict):
+            session.variables = variables
+        if session.trig_in_degrees and state.get("trig_in_degrees", True) is False:
+            self.set_radians_event(None)
+        if self.theme == "dark" and state.get("theme") == "light":
+            self.toggle_theme()
+
+        # Then the history in small slices between events, and the parse
+        # cache in the background
+        history = state.get("history")
+        if isinstance(history, list):
+            self._restore_history([item for item in history if isinstance(item, str)], 0)
+        hot = state.get("hot_expressions")
+        if isinstance(hot, list):
+            self._background_executor.submit(warm_parse_cache, hot)
+
+    def _restore_history(self, items, start, chunk=50):
+        # Older entries go above anything typed since startup. Restored lines
+        # are display-only; the session history starts with this run.
+        self.history_list.insert(start, *items[start:start + chunk])
+        if start + chunk < len(items):
+            self.root.after(1, self._restore_history, items, start + chunk, chunk)
+        else:
+            self.history_list.see(tk.END)
+
+    def on_close(self):
+        try:
+            save_snapshot(self.snapshot())
+        except (OSError, ValueError):
+            pass  # never block closing the window
+        self.root.destroy()
+
+    # -------------------------------
+    # Statistics
+    # -------------------------------
+    def run_stats(self):
+        self._flush_input()
+        # A pasted list in the entry wins; otherwise ask for a file
+        data = self.entry_var.get().strip()
+        if data:
+            job = lambda: stats_from_lines([data])
+            source = "list"
+        else:
+            path = filedialog.askopenfilename(title="Numbers to summarise")
+            if not path:
+                return
+            job = lambda: stats_from_file(path)
+            source = path
+        self.error_var.set("Computing statistics...")
+        future = self._background_executor.submit(job)
+        self.root.after(PREVIEW_POLL_MS, self._poll_stats, future, source)
+
+    def _poll_stats(self, future, source):
+        if not future.done():
+            self.root.after(PREVIEW_POLL_MS, self._poll_stats, future, source)
+            return
+        try:
+            stats = future.result()
+        except Exception as e:
+            self.error_var.set(str(e) or "Invalid data")
+            return
+        # Rebind rather than mutate: a preview may be reading the old dict
+        self.session.variables = stats.as_variables()
+        summary = ", ".join(f"{k}={format_result(v)}" for k, v in self.session.variables.items())
+        self.add_history(f"stats({source})", summary)
+        self.entry_var.set("")
+        self.error_var.set("Use count, total, mean, var, stdev, min, max, q1, median, q3")
+
     def _sqrt(self):
+        self._flush_input()
         exp = self.entry_var.get().strip()
         if not exp:
             self.just_evaluated = True
             return
         try:
-            value = float(exp)
-            if value < 0:
-                raise ValueError
-            result = math.sqrt(value)
-            display = str(result)
-            self.entry_var.set(display)
+            result = self.session.sqrt(exp)
+            self.entry_var.set(format_result(result))
             self.error_var.set("")
-            self.add_history(value, display)
+            self._show_history(*self.session.history[-1])
             self.just_evaluated = True
         except ValueError as e:
             self.just_evaluated = False
@@ -426,8 +611,11 @@ class CalculatorApp:
     # History
     # -------------------------------
     def add_history(self, expr, result):
+        self._show_history(expr, self.session.add_history(expr, result))
+
+    def _show_history(self, expr, text):
         ts = time.strftime("%H:%M:%S")
-        item = f"[{ts}] {expr} = {result}"
+        item = f"[{ts}] {expr} = {text}"
         self.history_list.insert(tk.END, item)
         self.history_list.see(tk.END)
 
@@ -459,6 +647,7 @@ class CalculatorApp:
     # Memory keys
     # -------------------------------
     def memory_action(self, action):
+        self._flush_input()
         try:
             current = float(self.entry_var.get()) if self.entry_var.get() else 0.0
         except ValueError:
@@ -466,33 +655,36 @@ class CalculatorApp:
             return
 
         if action == "MC":
-            self.memory = 0.0
+            self.session.memory_clear()
             self.error_var.set("Memory cleared")
         elif action == "MR":
-            self.entry_var.set(str(self.memory))
+            self.entry_var.set(str(self.session.memory_recall()))
             self.error_var.set("")
         elif action == "M+":
-            self.memory += current
-            self.error_var.set(f"Memory: {self.memory}")
+            self.session.memory_add(current)
+            self.error_var.set(f"Memory: {self.session.memory}")
         elif action == "M-":
-            self.memory -= current
-            self.error_var.set(f"Memory: {self.memory}")
+            self.session.memory_subtract(current)
+            self.error_var.set(f"Memory: {self.session.memory}")
 
     # -------------------------------
     # Mode and theme
     # -------------------------------
     def toggle_mode(self):
-        self.trig_in_degrees = not self.trig_in_degrees
-        self.mode_var.set("Degrees" if self.trig_in_degrees else "Radians")
+        self.session.toggle_mode()
+        self.mode_var.set("Degrees" if self.session.trig_in_degrees else "Radians")
         self.error_var.set("")
+        self._schedule_preview()
 
     def set_degrees_event(self, _):
-        self.trig_in_degrees = True
+        self.session.trig_in_degrees = True
         self.mode_var.set("Degrees")
+        self._schedule_preview()
 
     def set_radians_event(self, _):
-        self.trig_in_degrees = False
+        self.session.trig_in_degrees = False
         self.mode_var.set("Radians")
+        self._schedule_preview()
 
     def toggle_theme(self):
         self.theme = "light" if self.theme == "dark" else "dark"
@@ -503,9 +695,44 @@ class CalculatorApp:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Advanced calculator")
+    parser.add_argument("--stats", metavar="FILE",
+                        help='print streaming statistics of the numbers in FILE ("-" for stdin)')
+    parser.add_argument("expression", nargs="?",
+                        help="evaluate without the GUI; with --stats the results are usable as names")
+    parser.add_argument("--radians", action="store_true", help="trig functions take radians")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="evaluate one expression per line of FILE into the binary file given by --out")
+    parser.add_argument("--out", metavar="PATH", help="output file for --batch")
+    args = parser.parse_args()
+    if args.batch and not args.out:
+        parser.error("--batch requires --out")
+
+    if args.stats or args.expression or args.batch:
+        try:
+            variables = stats_from_file(args.stats).as_variables() if args.stats else {}
+            if args.batch:
+                count = write_batch_file(args.batch, args.out, trig_in_degrees=not args.radians,
+                                         variables=variables)
+                print(f"{count} rows written to {args.out}")
+            elif args.expression:
+                result = safe_eval(args.expression, trig_in_degrees=not args.radians,
+                                   variables=variables)
+                print(format_result(result))
+            else:
+                for name, value in variables.items():
+                    print(f"{name}\t{format_result(value)}")
+        except (OSError, ValueError, ArithmeticError) as e:
+            sys.exit(f"Error: {e}")
+        return
+
     root = tk.Tk()
     app = CalculatorApp(root)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app._preview_executor.shutdown(wait=False, cancel_futures=True)
+        app._background_executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
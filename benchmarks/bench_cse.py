@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Common-subexpression elimination benchmark: times safe_eval with the CSE
+table enabled and with it switched off, on an expression with repeated
+subtrees and on distinct rows with nothing to share.
+
+    python benchmarks/bench_cse.py
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adv_calculator_core as calc  # noqa: E402
+
+REPEATED = "+".join(["sin(30)^2*cos(30)^2"] * 30)
+DISTINCT_ROWS = [f"{i}*2+sin({i})" for i in range(50_000)]
+
+
+def _time(fn):
+    # Parse cache cleared first so parsing is counted
+    calc._parse_cache.clear()
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run(repeat=5):
+    cases = {
+        "repeated subtrees x5000":
+            lambda: [calc.safe_eval(REPEATED, trig_in_degrees=True) for _ in range(5_000)],
+        "50k distinct rows": lambda: [calc.safe_eval(row) for row in DISTINCT_ROWS],
+    }
+    configs = {"cse": calc._may_share, "no cse": lambda expr: False}
+
+    # Best of several runs, alternating the two configurations so drift in
+    # machine load affects both alike
+    best = {(config, case): math.inf for config in configs for case in cases}
+    for _ in range(repeat):
+        for case, fn in cases.items():
+            for config, may_share in configs.items():
+                calc._may_share = may_share
+                best[config, case] = min(best[config, case], _time(fn))
+    calc._may_share = configs["cse"]
+
+    for config in configs:
+        print(config)
+        for case in cases:
+            print(f"  {case:<28}{best[config, case]:8.3f} s")
+    repeated, distinct = cases
+    speedup = best["no cse", repeated] / best["cse", repeated]
+    overhead = best["cse", distinct] / best["no cse", distinct]
+    print(f"repeated-subtree speedup: {speedup:.2f}x, distinct-row cost: {overhead:.2f}x")
+
+
+if __name__ == "__main__":
+    run()